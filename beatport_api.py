@@ -3,6 +3,14 @@ import json
 import logging
 from datetime import timedelta, datetime
 
+from requests.adapters import HTTPAdapter
+
+try:
+    # orjson decodes the large paginated responses considerably faster, fall back to json if missing
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
+
 from utils.utils import create_requests_session
 
 
@@ -19,6 +27,15 @@ class BeatportApi:
         self.expires = None
         
         self.s = create_requests_session()
+        # Keep the retry policy but enlarge the connection pool so paginated and concurrent
+        # calls to the API host reuse keep-alive TLS connections instead of reconnecting
+        retries = self.s.get_adapter(self.API_URL).max_retries
+        self.s.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=20, max_retries=retries))
+        self.s.headers.update({
+            'Accept-Encoding': 'gzip',
+            'Connection': 'Keep-Alive',
+            'User-Agent': 'okhttp/4.12.0'
+        })
         
         # Setup debug logging
         debug_dir = 'debug'
@@ -41,6 +58,16 @@ class BeatportApi:
         # Initialize debug mode as disabled
         self.debug_enabled = False
 
+    def close(self):
+        """Close all pooled connections"""
+        self.s.close()
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
     def headers(self, use_access_token: bool = False):
         headers = {
             'Accept-Encoding': 'gzip',
@@ -290,7 +317,7 @@ class BeatportApi:
         if r.status_code not in {200, 201, 202}:
             raise ConnectionError(r.text)
 
-        return r.json()
+        return json_loads(r.content)
 
     def get_account(self):
         return self._get('auth/o/introspect')
@@ -301,6 +328,12 @@ class BeatportApi:
     def get_release(self, release_id: str):
         return self._get(f'catalog/releases/{release_id}')
 
+    def get_releases(self, release_ids: list):
+        return self._get('catalog/releases/', params={
+            'id': ','.join(map(str, release_ids)),
+            'per_page': 100
+        })
+
     def get_release_tracks(self, release_id: str, page: int = 1, per_page: int = 100):
         return self._get(f'catalog/releases/{release_id}/tracks', params={
             'page': page,
@@ -369,7 +402,7 @@ class BeatportApi:
         if response.status_code != 200:
             raise Exception(f"Failed to get stream URL: {response.text}")
         
-        data = response.json()
+        data = json_loads(response.content)
         return data
 
     def get_track_download(self, track_id: str, quality: str):
@@ -456,5 +489,5 @@ class BeatportApi:
         if response.status_code != 200:
             raise Exception(f"Failed to get stream URL: {response.text}")
         
-        data = response.json()
+        data = json_loads(response.content)
         return data
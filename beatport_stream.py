@@ -2,14 +2,20 @@ import requests
 import m3u8
 from Crypto.Cipher import AES
 import os
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 from urllib.parse import urljoin, urlparse
 import logging
 import ffmpeg
 
 class BeatportStream:
+    # number of segments downloaded in parallel
+    max_workers = 8
+
     def __init__(self, auth):
         self.auth = auth
         self.session = requests.Session()
+        self.session.mount('https://', HTTPAdapter(pool_maxsize=self.max_workers))
         self.base_url = None
         
         # Use the same logger and debug setting as BeatportApi
@@ -81,6 +87,26 @@ class BeatportStream:
             
         return response.content
         
+    def _download_segment(self, segment, key):
+        """Download and decrypt a single HLS segment"""
+        # Get full segment URL
+        segment_url = urljoin(self.base_url, segment.uri)
+
+        # Download segment
+        response = self.session.get(segment_url)
+        if response.status_code != 200:
+            raise Exception(f"Failed to download segment: {response.text}")
+
+        data = response.content
+
+        # Decrypt if needed
+        if key:
+            iv = bytes.fromhex(segment.key.iv[2:] if segment.key.iv else '0' * 32)
+            cipher = AES.new(key, AES.MODE_CBC, iv)
+            data = cipher.decrypt(data)
+
+        return data
+
     def download_segments(self, manifest_data, output_file):
         """Download and decrypt HLS segments"""
         try:
@@ -95,26 +121,19 @@ class BeatportStream:
             temp_aac = output_file + '.temp.aac'
             
             try:
-                with open(temp_aac, 'wb') as outfile:
-                    for segment in manifest_data['segments']:
-                        # Get full segment URL
-                        segment_url = urljoin(self.base_url, segment.uri)
-                        
-                        # Download segment
-                        response = self.session.get(segment_url)
-                        if response.status_code != 200:
-                            raise Exception(f"Failed to download segment: {response.text}")
-                            
-                        data = response.content
-                        
-                        # Decrypt if needed
-                        if key:
-                            iv = bytes.fromhex(segment.key.iv[2:] if segment.key.iv else '0' * 32)
-                            cipher = AES.new(key, AES.MODE_CBC, iv)
-                            data = cipher.decrypt(data)
-                        
-                        # Write segment data
-                        outfile.write(data)
+                # Download segments concurrently and write them in playlist order
+                with open(temp_aac, 'wb') as outfile, ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                    futures = [executor.submit(self._download_segment, segment, key)
+                               for segment in manifest_data['segments']]
+                    try:
+                        for future in futures:
+                            # Write segment data
+                            outfile.write(future.result())
+                    except Exception:
+                        # Fail fast, cancel the queued segments instead of downloading them before raising
+                        for future in futures:
+                            future.cancel()
+                        raise
 
                 # Convert raw AAC to M4A using ffmpeg
                 stream = (
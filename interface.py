@@ -1,10 +1,13 @@
 import logging
+import math
 import re
-import shutil
-import ffmpeg
 import os
+import time
 
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from functools import lru_cache
+from operator import itemgetter
 
 from utils.models import (
     ModuleInformation, 
@@ -29,13 +32,12 @@ from utils.models import (
 )
 from utils.utils import create_temp_filename
 from .beatport_api import BeatportApi
-from .beatport_stream import BeatportStream
 
 module_information = ModuleInformation(
     service_name='Beatport',
     module_supported_modes=ModuleModes.download | ModuleModes.covers,
     session_settings={'username': '', 'password': ''},
-    session_storage_variables=['access_token', 'refresh_token', 'expires'],
+    session_storage_variables=['session'],
     global_settings={
         'debug': False,
         'quality': 'high',
@@ -46,8 +48,33 @@ module_information = ModuleInformation(
     test_url='https://www.beatport.com/track/darkside/10844269'
 )
 
+_URL_PATTERN = re.compile(r"https?://(www\.)?beatport\.com/(?:[a-z]{2}/)"
+                          r"?(?P<type>track|release|artist|playlists|chart)/.+?/(?P<id>\d+)")
+_RES_PATTERN = re.compile(r'\d{3,4}x\d{3,4}')
+_get_id = itemgetter('id')
+
+_BITRATE = {
+    "lossless": 1411,
+    "high": 256,
+    "medium": 128,
+}
+_LOSSLESS_TIERS = frozenset({QualityEnum.HIFI, QualityEnum.LOSSLESS})
+
+# how long a successful subscription check is trusted before asking the API again
+_SUBSCRIPTION_CHECK_TTL = timedelta(hours=1)
+
 
 class ModuleInterface:
+    # LOW = 128kbit/s AAC, MEDIUM = 128kbit/s AAC, HIGH = 256kbit/s AAC,
+    quality_parse = {
+        QualityEnum.MINIMUM: "medium",
+        QualityEnum.LOW: "medium",
+        QualityEnum.MEDIUM: "medium",
+        QualityEnum.HIGH: "high",
+        QualityEnum.LOSSLESS: "lossless",
+        QualityEnum.HIFI: "lossless"
+    }
+
     # noinspection PyTypeChecker
     def __init__(self, module_controller: ModuleController):
         self.exception = module_controller.module_error
@@ -57,44 +84,79 @@ class ModuleInterface:
         self.module_controller = module_controller
         self.cover_size = module_controller.orpheus_options.default_cover_options.resolution
 
-        # LOW = 128kbit/s AAC, MEDIUM = 128kbit/s AAC, HIGH = 256kbit/s AAC,
-        self.quality_parse = {
-            QualityEnum.MINIMUM: "medium",
-            QualityEnum.LOW: "medium",
-            QualityEnum.MEDIUM: "medium",
-            QualityEnum.HIGH: "high",
-            QualityEnum.LOSSLESS: "lossless",
-            QualityEnum.HIFI: "lossless"
-        }
+        # Create temp directory once instead of on every download
+        self._temp_dir = os.path.join(os.getcwd(), 'temp')
+        os.makedirs(self._temp_dir, exist_ok=True)
 
         # Initialize API and Auth instances
         self.session = BeatportApi()
         self.auth = self.session  # Use session as auth to maintain compatibility
-        self.stream = BeatportStream(self.session)  # Pass API instance instead of auth
+        # created on first download, see stream
+        self._stream = None
+
+        # memoize release and track lookups, tracks of a playlist or artist often share the same release
+        self._get_release = lru_cache(maxsize=512)(self.session.get_release)
+        self._get_track = lru_cache(maxsize=512)(self.session.get_track)
+        # warms up the releases of playlists and artists in the background, created on first use
+        self._prefetch_executor = None
+        self._prefetch_futures = []
         
         # Set debug mode from settings
         self.session.debug_enabled = module_controller.module_settings.get('debug', False)
         
-        # Get stored session data
-        session = {
-            'access_token': module_controller.temporary_settings_controller.read('access_token'),
-            'refresh_token': module_controller.temporary_settings_controller.read('refresh_token'),
-            'expires': module_controller.temporary_settings_controller.read('expires')
-        }
+        # Get stored session data, tokens and the last subscription check are stored as one record so every
+        # auth event only rewrites the temporary settings once
+        session = module_controller.temporary_settings_controller.read('session') or {}
 
         # Set session for API instance
         self.session.set_session(session)
+        self._subscription_checked_at = session.get('subscription_checked_at')
 
-        if session['refresh_token'] is None:
+        if session.get('refresh_token') is None:
             # No refresh token, do full login
             self.login(module_controller.module_settings['username'], 
                       module_controller.module_settings['password'])
-        elif session['refresh_token'] is not None and datetime.now() > session['expires']:
+        elif datetime.now() > session['expires']:
             # Token expired, refresh it
             self.refresh_token()
-
-        # Validate account after authentication is set up
-        self.valid_account()
+        else:
+            # Validate account, only save if the subscription had to be checked again
+            checked_at = self._subscription_checked_at
+            self.valid_account()
+            if self._subscription_checked_at != checked_at:
+                self._save_session()
+
+    def close(self):
+        # cancel the queued release prefetches (same as cancel_futures=True, which needs Python 3.9) and close all
+        # pooled connections
+        if self._prefetch_executor is not None:
+            for future in self._prefetch_futures:
+                future.cancel()
+            self._prefetch_executor.shutdown(wait=False)
+            self._prefetch_executor = None
+            self._prefetch_futures = []
+
+        self.session.close()
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+    @property
+    def stream(self):
+        # only import and create the HLS stream handler (m3u8, pycryptodome, ffmpeg) once a track is downloaded
+        if self._stream is None:
+            from .beatport_stream import BeatportStream
+            self._stream = BeatportStream(self.session)  # Pass API instance instead of auth
+        return self._stream
+
+    def _save_session(self):
+        # every set() rewrites the whole temporary settings file, so store everything in a single write
+        session = self.session.get_session()
+        session['subscription_checked_at'] = self._subscription_checked_at
+        self.module_controller.temporary_settings_controller.set('session', session)
 
     def refresh_token(self):
         logging.debug(f'Beatport: access_token expired, getting a new one')
@@ -112,10 +174,10 @@ class ModuleInterface:
         self.auth.refresh_token = self.session.refresh_token
         self.auth.token_expires = self.session.expires
 
+        self.valid_account()
+
         # Save to temporary settings
-        self.module_controller.temporary_settings_controller.set('access_token', self.session.access_token)
-        self.module_controller.temporary_settings_controller.set('refresh_token', self.session.refresh_token)
-        self.module_controller.temporary_settings_controller.set('expires', self.session.expires)
+        self._save_session()
 
     def login(self, email: str, password: str):
         """Login and store session data"""
@@ -125,15 +187,20 @@ class ModuleInterface:
         if login_data.get('error_description') is not None:
             raise self.exception(login_data.get('error_description'))
 
-        # Save to temporary settings
-        self.module_controller.temporary_settings_controller.set('access_token', self.session.access_token)
-        self.module_controller.temporary_settings_controller.set('refresh_token', self.session.refresh_token)
-        self.module_controller.temporary_settings_controller.set('expires', self.session.expires)
-
+        # a new login always gets its subscription checked again
+        self._subscription_checked_at = None
         self.valid_account()
 
+        # Save to temporary settings
+        self._save_session()
+
     def valid_account(self):
         if not self.disable_subscription_check:
+            # skip the API call if the subscription was verified recently, only successful checks are stored
+            checked_at = self._subscription_checked_at
+            if checked_at and datetime.now() - checked_at < _SUBSCRIPTION_CHECK_TTL:
+                return
+
             try:
                 # Just check subscription status directly
                 subscription_data = self.session.get_subscription()
@@ -159,10 +226,12 @@ class ModuleInterface:
                 logging.error(f"Error validating account: {str(e)}")
                 raise self.exception('Failed to validate Beatport account')
 
+            # saved with the rest of the session by the caller
+            self._subscription_checked_at = datetime.now()
+
     @staticmethod
     def custom_url_parse(link: str):
-        match = re.search(r"https?://(www.)?beatport.com/(?:[a-z]{2}/)"
-                          r"?(?P<type>track|release|artist|playlists|chart)/.+?/(?P<id>\d+)", link)
+        match = _URL_PATTERN.search(link)
 
         # so parse the regex "match" to the actual DownloadTypeEnum
         media_types = {
@@ -187,15 +256,76 @@ class ModuleInterface:
             size = max_size
 
         # check if it's a dynamic_uri, if not make it one
-        res_pattern = re.compile(r'\d{3,4}x\d{3,4}')
-        match = re.search(res_pattern, cover_url)
+        match = _RES_PATTERN.search(cover_url)
         if match:
             # replace the hardcoded resolution with dynamic one
-            cover_url = re.sub(res_pattern, '{w}x{h}', cover_url)
+            cover_url = _RES_PATTERN.sub('{w}x{h}', cover_url)
 
         # replace the dynamic_uri h and w parameter with the wanted size
         return cover_url.format(w=size, h=size)
 
+    def _fetch_pages(self, fetch_page, item_id: str, tracks: list, last_page: int, total_tracks: int,
+                     unfold_track: bool = False) -> list:
+        # preallocate the full track list and fill it page by page
+        all_tracks = [None] * total_tracks
+        all_tracks[0:len(tracks)] = tracks
+        fetched = len(tracks)
+        last_progress = 0.0
+
+        # pages 2..last_page are independent, so request them concurrently over the pooled session
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            futures = {page: executor.submit(fetch_page, item_id, page=page) for page in range(2, last_page + 1)}
+
+            for page, future in futures.items():
+                results = future.result().get('results')
+                if unfold_track:
+                    # unfold the track element
+                    results = [t.get('track') for t in results]
+
+                start = (page - 1) * 100
+                all_tracks[start:start + len(results)] = results
+                fetched += len(results)
+
+                # limit the progress output to 10 updates per second
+                now = time.monotonic()
+                if now - last_progress > 0.1:
+                    print(f'Fetching {fetched}/{total_tracks}', end='\r')
+                    last_progress = now
+
+        # drop the unfilled slots if the API returned fewer tracks than announced
+        if fetched < total_tracks:
+            all_tracks = [t for t in all_tracks if t is not None]
+
+        return all_tracks
+
+    def _fetch_releases(self, release_ids: list, releases: dict):
+        try:
+            for release in self.session.get_releases(release_ids).get('results'):
+                releases[release.get('id')] = release
+        except Exception as e:
+            # get_track_info() falls back to requesting the missing releases on its own
+            logging.debug(f'Beatport: prefetching releases failed: {str(e)}')
+
+    def _prefetch_releases(self, tracks: list) -> dict:
+        # fetch all releases of the tracks in batches of 100 in the background, so get_track_info() finds them
+        # cached while the previous tracks are downloading; kept apart from the track data as track and release
+        # ids can collide
+        releases = {}
+        release_ids = list({t.get('release').get('id') for t in tracks if t.get('release')})
+        if not release_ids:
+            return releases
+
+        if self._prefetch_executor is None:
+            self._prefetch_executor = ThreadPoolExecutor(max_workers=4)
+
+        # forget the finished prefetches of earlier playlists or artists
+        self._prefetch_futures = [f for f in self._prefetch_futures if not f.done()]
+        for i in range(0, len(release_ids), 100):
+            self._prefetch_futures.append(
+                self._prefetch_executor.submit(self._fetch_releases, release_ids[i:i + 100], releases))
+
+        return releases
+
     def search(self, query_type: DownloadTypeEnum, query: str, track_info: TrackInfo = None, limit: int = 20):
         results = self.session.get_search(query)
 
@@ -212,16 +342,16 @@ class ModuleInterface:
             duration = None
             if query_type is DownloadTypeEnum.playlist:
                 artists = [i.get('person').get('owner_name') if i.get('person') else 'Beatport']
-                year = i.get('change_date')[:4] if i.get('change_date') else None
+                year = (i.get('change_date') or '')[:4] or None
             elif query_type is DownloadTypeEnum.track:
                 artists = [a.get('name') for a in i.get('artists')]
-                year = i.get('publish_date')[:4] if i.get('publish_date') else None
+                year = (i.get('publish_date') or '')[:4] or None
 
                 duration = i.get('length_ms') // 1000
                 additional.append(f'{i.get("bpm")}BPM')
             elif query_type is DownloadTypeEnum.album:
                 artists = [j.get('name') for j in i.get('artists')]
-                year = i.get('publish_date')[:4] if i.get('publish_date') else None
+                year = (i.get('publish_date') or '')[:4] or None
             elif query_type is DownloadTypeEnum.artist:
                 artists = None
                 year = None
@@ -265,30 +395,33 @@ class ModuleInterface:
             playlist_tracks = [t.get('track') for t in playlist_tracks_data.get('results')]
 
         total_tracks = playlist_tracks_data.get('count')
-        for page in range(2, (total_tracks - 1) // 100 + 2):
-            print(f'Fetching {len(playlist_tracks)}/{total_tracks}', end='\r')
-            # get the DJ chart or user playlist
-            if is_chart:
-                playlist_tracks += self.session.get_chart_tracks(playlist_id, page=page).get('results')
-            else:
-                # unfold the track element
-                playlist_tracks += [t.get('track')
-                                    for t in self.session.get_playlist_tracks(playlist_id, page=page).get('results')]
-
-        for i, track in enumerate(playlist_tracks):
+        last_page = math.ceil(total_tracks / 100)
+        fetch_page = self.session.get_chart_tracks if is_chart else self.session.get_playlist_tracks
+        playlist_tracks = self._fetch_pages(fetch_page, playlist_id, playlist_tracks, last_page, total_tracks,
+                                            unfold_track=not is_chart)
+
+        # number the tracks, collect their ids and sum up their lengths in a single pass
+        track_ids = []
+        duration = 0
+        for i, track in enumerate(playlist_tracks, 1):
             # add the track numbers
-            track['track_number'] = i + 1
+            track['track_number'] = i
             track['total_tracks'] = total_tracks
             # add the modified track to the track_extra_kwargs
-            cache['data'][track.get('id')] = track
+            track_id = track.get('id')
+            cache['data'][track_id] = track
+            track_ids.append(track_id)
+            duration += (track.get('length_ms') or 0) // 1000
+
+        cache['releases'] = self._prefetch_releases(playlist_tracks)
 
         creator = 'User'
         if is_chart:
             creator = playlist_data.get('person').get('owner_name') if playlist_data.get('person') else 'Beatport'
-            release_year = playlist_data.get('change_date')[:4] if playlist_data.get('change_date') else None
+            release_year = (playlist_data.get('change_date') or '')[:4] or None
             cover_url = playlist_data.get('image').get('dynamic_uri')
         else:
-            release_year = playlist_data.get('updated_date')[:4] if playlist_data.get('updated_date') else None
+            release_year = (playlist_data.get('updated_date') or '')[:4] or None
             # always get the first image of the four total images, why is there no dynamic_uri available? Annoying
             cover_url = playlist_data.get('release_images')[0]
 
@@ -296,8 +429,8 @@ class ModuleInterface:
             name=playlist_data.get('name'),
             creator=creator,
             release_year=release_year,
-            duration=sum([t.get('length_ms', 0) // 1000 for t in playlist_tracks]),
-            tracks=[t.get('id') for t in playlist_tracks],
+            duration=duration,
+            tracks=track_ids,
             cover_url=self._generate_artwork_url(cover_url, self.cover_size),
             track_extra_kwargs=cache
         )
@@ -309,14 +442,20 @@ class ModuleInterface:
         # now fetch all the found total_items
         artist_tracks = artist_tracks_data.get('results')
         total_tracks = artist_tracks_data.get('count')
-        for page in range(2, total_tracks // 100 + 2):
-            print(f'Fetching {page * 100}/{total_tracks}', end='\r')
-            artist_tracks += self.session.get_artist_tracks(artist_id, page=page).get('results')
+        last_page = math.ceil(total_tracks / 100)
+        artist_tracks = self._fetch_pages(self.session.get_artist_tracks, artist_id, artist_tracks, last_page,
+                                          total_tracks)
+
+        track_ids = list(map(_get_id, artist_tracks))
+        cache = {
+            'data': dict(zip(track_ids, artist_tracks)),
+            'releases': self._prefetch_releases(artist_tracks)
+        }
 
         return ArtistInfo(
             name=artist_data.get('name'),
-            tracks=[t.get('id') for t in artist_tracks],
-            track_extra_kwargs={'data': {t.get('id'): t for t in artist_tracks}},
+            tracks=track_ids,
+            track_extra_kwargs=cache,
         )
 
     def get_album_info(self, album_id: str, data=None, is_chart: bool = False) -> AlbumInfo:
@@ -324,49 +463,66 @@ class ModuleInterface:
         if data is None:
             data = {}
 
-        album_data = data.get(album_id) if album_id in data else self.session.get_release(album_id)
+        album_data = data.get(album_id) if album_id in data else self._get_release(album_id)
         tracks_data = self.session.get_release_tracks(album_id)
 
         # now fetch all the found total_items
         tracks = tracks_data.get('results')
         total_tracks = tracks_data.get('count')
-        for page in range(2, total_tracks // 100 + 2):
-            print(f'Fetching {len(tracks)}/{total_tracks}', end='\r')
-            tracks += self.session.get_release_tracks(album_id, page=page).get('results')
+        last_page = math.ceil(total_tracks / 100)
+        tracks = self._fetch_pages(self.session.get_release_tracks, album_id, tracks, last_page, total_tracks)
 
         cache = {'data': {album_id: album_data}}
-        for i, track in enumerate(tracks):
+        # number the tracks, collect their ids and sum up their lengths in a single pass
+        track_ids = []
+        duration = 0
+        for i, track in enumerate(tracks, 1):
             # add the track numbers
-            track['number'] = i + 1
+            track['number'] = i
             # add the modified track to the track_extra_kwargs
-            cache['data'][track.get('id')] = track
+            track_id = track.get('id')
+            cache['data'][track_id] = track
+            track_ids.append(track_id)
+            duration += (track.get('length_ms') or 0) // 1000
 
         return AlbumInfo(
             name=album_data.get('name'),
-            release_year=album_data.get('publish_date')[:4] if album_data.get('publish_date') else None,
-            # sum up all the individual track lengths
-            duration=sum([t.get('length_ms') // 1000 for t in tracks]),
+            release_year=(album_data.get('publish_date') or '')[:4] or None,
+            duration=duration,
             upc=album_data.get('upc'),
             cover_url=self._generate_artwork_url(album_data.get('image').get('dynamic_uri'), self.cover_size),
             artist=album_data.get('artists')[0].get('name'),
             artist_id=album_data.get('artists')[0].get('id'),
-            tracks=[t.get('id') for t in tracks],
+            tracks=track_ids,
             track_extra_kwargs=cache
         )
 
     def get_track_info(self, track_id: str, quality_tier: QualityEnum, codec_options: CodecOptions, slug: str = None,
-                       data=None, is_chart: bool = False) -> TrackInfo:
+                       data=None, releases=None, is_chart: bool = False) -> TrackInfo:
         if data is None:
             data = {}
+        if releases is None:
+            releases = {}
 
-        track_data = data[track_id] if track_id in data else self.session.get_track(track_id)
+        track_data = data[track_id] if track_id in data else self._get_track(track_id)
 
-        album_id = track_data.get('release').get('id')
+        # bind the nested objects once, they are used multiple times below
+        release = track_data['release']
+        label = (release.get('label') or {}).get('name')
+        artists = track_data.get('artists') or []
+        first_artist = artists[0] if artists else {}
+
+        album_id = release.get('id')
         album_data = {}
         error = None
 
         try:
-            album_data = data[album_id] if album_id in data else self.session.get_release(album_id)
+            if album_id in releases:
+                album_data = releases[album_id]
+            elif album_id in data:
+                album_data = data[album_id]
+            else:
+                album_data = self._get_release(album_id)
         except ConnectionError as e:
             # check if the album is region locked
             if 'Territory Restricted.' in str(e):
@@ -375,7 +531,7 @@ class ModuleInterface:
         track_name = track_data.get('name')
         track_name += f' ({track_data.get("mix_name")})' if track_data.get("mix_name") else ''
 
-        release_year = track_data.get('publish_date')[:4] if track_data.get('publish_date') else None
+        release_year = (track_data.get('publish_date') or '')[:4] or None
         genres = [track_data.get('genre').get('name')]
         # check if a second genre exists
         genres += [track_data.get('sub_genre').get('name')] if track_data.get('sub_genre') else []
@@ -394,8 +550,8 @@ class ModuleInterface:
             isrc=track_data.get('isrc'),
             genres=genres,
             release_date=track_data.get('publish_date'),
-            copyright=f'© {release_year} {track_data.get("release").get("label").get("name")}',
-            label=track_data.get('release').get('label').get('name'),
+            copyright=f'© {release_year} {label}',
+            label=label,
             extra_tags=extra_tags
         )
 
@@ -405,28 +561,22 @@ class ModuleInterface:
             error = f'Track "{track_data.get("name")}" is not yet released!'
 
         quality = self.quality_parse[quality_tier]
-        bitrate = {
-            "lossless": 1411,
-            "high": 256,
-            "medium": 128,
-        }
         length_ms = track_data.get('length_ms')
 
         track_info = TrackInfo(
             name=track_name,
             album=album_data.get('name'),
             album_id=album_data.get('id'),
-            artists=[a.get('name') for a in track_data.get('artists')],
-            artist_id=track_data.get('artists')[0].get('id'),
+            artists=[a.get('name') for a in artists],
+            artist_id=first_artist.get('id'),
             release_year=release_year,
             duration=length_ms // 1000 if length_ms else None,
-            bitrate=bitrate[quality],
+            bitrate=_BITRATE[quality],
             bit_depth=16 if quality == "lossless" else None,
             sample_rate=44.1,
-            cover_url=self._generate_artwork_url(
-                track_data.get('release').get('image').get('dynamic_uri'), self.cover_size),
+            cover_url=self._generate_artwork_url(release.get('image').get('dynamic_uri'), self.cover_size),
             tags=tags,
-            codec=CodecEnum.AAC if quality_tier not in {QualityEnum.HIFI, QualityEnum.LOSSLESS} else CodecEnum.FLAC,
+            codec=CodecEnum.AAC if quality_tier not in _LOSSLESS_TIERS else CodecEnum.FLAC,
             download_extra_kwargs={'track_id': track_id, 'quality_tier': quality_tier},
             error=error
         )
@@ -437,7 +587,7 @@ class ModuleInterface:
         if data is None:
             data = {}
 
-        track_data = data[track_id] if track_id in data else self.session.get_track(track_id)
+        track_data = data[track_id] if track_id in data else self._get_track(track_id)
         cover_url = track_data.get('release').get('image').get('dynamic_uri')
 
         return CoverInfo(
@@ -448,10 +598,6 @@ class ModuleInterface:
         """Get track download/stream info"""
         temp_file = None
         try:
-            # Create temp directory if it doesn't exist
-            temp_dir = os.path.join(os.getcwd(), 'temp')
-            os.makedirs(temp_dir, exist_ok=True)
-            
             # Get quality setting from quality tier
             quality = self.quality_parse[quality_tier]
             
@@ -461,7 +607,7 @@ class ModuleInterface:
                 raise self.exception('Could not get stream URL')
 
             # Create temp file with .m4a extension in temp directory
-            temp_file = os.path.join(temp_dir, create_temp_filename() + '.m4a')
+            temp_file = os.path.join(self._temp_dir, create_temp_filename() + '.m4a')
             
             # Get manifest and encryption info
             manifest_data = self.stream.get_stream_manifest(stream_data['stream_url'])